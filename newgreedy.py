@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """NewGreedy v1.7.5 — launcher"""
-import configparser, logging, os, signal, sys, threading, time, urllib.request, json
+import atexit, configparser, logging, logging.handlers, os, queue, signal, sys, threading, time, urllib.request, json
 from pathlib import Path
 
 VERSION = "v1.7.5"
@@ -8,12 +8,18 @@ GITHUB_REPO = "Mrt0t0/NewGreedy"
 
 _BASE = Path(__file__).parent.resolve()
 _CONFIG_FILE = _BASE / "config.ini"
+_UPDATE_STAMP = _BASE / ".update_check"
+UPDATE_CHECK_INTERVAL = 86400
 
 _root_logger = logging.getLogger()
 _root_logger.setLevel(logging.INFO)
 _handler = logging.StreamHandler(sys.stdout)
 _handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-_root_logger.addHandler(_handler)
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _handler)
+_root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger("NewGreedy")
 
 cfg = configparser.ConfigParser(inline_comment_prefixes=(";", "#"))
@@ -39,6 +45,12 @@ def _parse_version(v: str):
     return tuple(parts[:3])
 
 def _check_update():
+    try:
+        if time.time() - _UPDATE_STAMP.stat().st_mtime < UPDATE_CHECK_INTERVAL:
+            logger.debug("Update check skipped — last check under 24h ago")
+            return
+    except OSError:
+        pass
     try:
         url = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
         req = urllib.request.Request(url, headers={"User-Agent": "NewGreedy-updater"})
@@ -52,6 +64,11 @@ def _check_update():
             logger.info("NewGreedy is up to date (%s)", VERSION)
     except Exception as e:
         logger.debug("Update check failed: %s", e)
+        return
+    try:
+        _UPDATE_STAMP.touch()
+    except OSError as e:
+        logger.debug("Update stamp not written: %s", e)
 
 def _start_web():
     try:
@@ -60,7 +77,7 @@ def _start_web():
         set_config(cfg)
         host = cfg.get("web", "web_host", fallback="0.0.0.0")
         port = cfg.getint("web", "web_port", fallback=8080)
-        uvicorn.run(app, host=host, port=port, log_level="warning")
+        uvicorn.run(app, host=host, port=port, log_level="warning", timeout_keep_alive=20)
     except Exception as e:
         logger.warning("Web UI not started: %s", e)
 
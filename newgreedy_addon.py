@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 """NewGreedy v1.7.5 — core addon"""
-import random, math, time, json, re, logging, struct, configparser, threading
+import random, math, time, json, re, logging, logging.handlers, queue, shutil, configparser, functools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from urllib.parse import urlparse, parse_qs, unquote_to_bytes
+from urllib.parse import unquote_to_bytes
 from mitmproxy import http
 import pathlib
 
@@ -13,16 +15,34 @@ LOG_FILE           = str(_BASE / "newgreedy.log")
 STATS_FILE         = str(_BASE / "stats.json")
 PURGE_PENDING_FILE = str(_BASE / "purge_pending.json")
 REGISTRY_FILE      = str(_BASE / "torrent_registry.json")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(LOG_FILE, encoding="utf-8"),
-    ],
-)
+LOG_RETENTION_DAYS = 7
+
+
+def _copy_truncate(source, dest):
+    # docker-compose bind-mounts newgreedy.log as a single file, which cannot be renamed.
+    shutil.copyfile(source, dest)
+    with open(source, "r+b") as f:
+        f.truncate()
+
+
+_log_fmt      = logging.Formatter("%(asctime)s %(message)s")
+_log_queue    = queue.SimpleQueue()
+_log_file     = logging.handlers.TimedRotatingFileHandler(LOG_FILE, when="midnight",
+                                                          backupCount=LOG_RETENTION_DAYS, encoding="utf-8")
+_log_file.rotator = _copy_truncate
+_log_handlers = [logging.StreamHandler(), _log_file]
+for _h in _log_handlers:
+    _h.setFormatter(_log_fmt)
+_log_listener = logging.handlers.QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+_log_listener.start()
+# mitmproxy (and the launcher) install root handlers before this script is
+# loaded, so basicConfig() would be a no-op. The queue owns stderr and the
+# file for our records; propagating as well would print them twice.
 logger = logging.getLogger("NewGreedy")
+logger.addHandler(_queue_handler)
+logger.propagate = False
 
 PEER_ID_PREFIXES = [
     b"-qB4680-", b"-qB4700-", b"-TR3000-", b"-TR3100-",
@@ -41,9 +61,16 @@ UA_ACCEPT = {
     "libtorrent": "text/plain, application/x-bittorrent",
 }
 
+_UNRESERVED = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+_PCT_TABLE  = tuple(bytes([b]) if b in _UNRESERVED else b"%%%02X" % b for b in range(256))
+
+_BYTES_TO_MB = 1.0 / 1e6
+
 TRACKER_BACKOFF_THRESHOLD = 3
 TRACKER_BACKOFF_MAX_S     = 1800
 
+VALID_HASH_RE = re.compile(r"^[0-9a-f]{6,40}$")
+
 
 def _rand_peer_id():
     prefix = random.choice(PEER_ID_PREFIXES)
@@ -54,6 +81,7 @@ def _ua_for_prefix(p):
     return UA_MAP.get(p, "qBittorrent/4.6.8")
 
 
+@functools.lru_cache(maxsize=32)
 def _accept_for_ua(ua):
     for k, v in UA_ACCEPT.items():
         if k in ua:
@@ -61,11 +89,15 @@ def _accept_for_ua(ua):
     return "*/*"
 
 
-def _tracker_domain(url):
-    try:
-        return urlparse(url).netloc.split(":")[0]
-    except Exception:
-        return ""
+def _pct_encode(raw: bytes) -> bytes:
+    return b"".join(_PCT_TABLE[b] for b in raw)
+
+
+def _split_path(raw_path: bytes):
+    q_start = raw_path.find(b"?")
+    if q_start == -1:
+        return raw_path, b""
+    return raw_path[:q_start], raw_path[q_start + 1:]
 
 
 def _load_cfg():
@@ -74,35 +106,38 @@ def _load_cfg():
     return c
 
 
-def _extract_infohash(raw_query: bytes) -> str:
+def _query_fields(raw_query: bytes) -> dict:
+    fields = {}
     for part in raw_query.split(b"&"):
-        if part.startswith(b"info_hash="):
-            raw = part[len(b"info_hash="):]
-            try:
-                return unquote_to_bytes(raw).hex()
-            except Exception:
-                pass
-    return ""
+        k, _, v = part.partition(b"=")
+        fields.setdefault(k, v)
+    return fields
+
+
+def _extract_infohash(fields: dict) -> str:
+    raw = fields.get(b"info_hash")
+    if raw is None:
+        return ""
+    try:
+        return unquote_to_bytes(raw).hex()
+    except Exception:
+        return ""
 
 
 def _patch_query_bytes(raw_query: bytes, patches: dict) -> bytes:
-    parts   = raw_query.split(b"&")
+    encoded = {k: v if isinstance(v, bytes) else b"%d" % v for k, v in patches.items()}
     result  = []
     patched = set()
-    for part in parts:
-        if b"=" not in part:
-            result.append(part)
-            continue
-        k, _ = part.split(b"=", 1)
-        key  = k.decode("utf-8", errors="replace")
-        if key in patches:
-            result.append(k + b"=" + str(patches[key]).encode())
-            patched.add(key)
+    for part in raw_query.split(b"&"):
+        k, sep, _ = part.partition(b"=")
+        if sep and k in encoded:
+            result.append(k + b"=" + encoded[k])
+            patched.add(k)
         else:
             result.append(part)
-    for key, val in patches.items():
+    for key, val in encoded.items():
         if key not in patched:
-            result.append(key.encode() + b"=" + str(val).encode())
+            result.append(key + b"=" + val)
     return b"&".join(result)
 
 
@@ -142,23 +177,85 @@ def _parse_hours(spec: str):
         return 0, 23
 
 
+def _parse_log_level(spec: str) -> int:
+    level = logging.getLevelName(spec.strip().upper())
+    if isinstance(level, int):
+        return level
+    logger.warning("log_level '%s' invalid — falling back to INFO", spec)
+    return logging.INFO
+
+
+def _clamp(key: str, value, lo, hi):
+    if lo <= value <= hi:
+        return value
+    clamped = min(max(value, lo), hi)
+    logger.warning("%s = %s out of range %s-%s — clamped to %s", key, value, lo, hi, clamped)
+    return clamped
+
+
+def _parse_port_range(spec: str):
+    try:
+        lo, hi = (int(x) for x in spec.strip().split("-"))
+        if not (1 <= lo <= hi <= 65535):
+            raise ValueError(spec)
+        return lo, hi
+    except Exception:
+        logger.warning("port_range '%s' invalid — falling back to 6881-6999", spec)
+        return 6881, 6999
+
+
+@dataclass(frozen=True, slots=True)
+class EngineConfig:
+    stagnation_p:  float
+    catch_up:      float
+    max_speed:     float
+    noise_pct:     float
+    max_ratio_t:   float
+    seed_credit:   float
+    stall_thr:     int
+    min_ann_stag:  int
+    corrupt_p:     float
+    target_ratio:  float
+    auto_stop:     bool
+    active_hours:  tuple
+    always_active: bool
+
+    @classmethod
+    def from_cfg(cls, cfg):
+        inf = float("inf")
+
+        def num(section, key, fallback, lo=0.0, hi=inf, get=cfg.getfloat):
+            return _clamp(key, get(section, key, fallback=fallback), lo, hi)
+
+        active_hours = _parse_hours(cfg.get("advanced", "inject_hours", fallback="0-23"))
+        return cls(
+            stagnation_p  = num("spoofing", "stagnation_probability", 0.03, hi=1.0),
+            catch_up      = num("spoofing", "catch_up_factor", 0.22, hi=1.0),
+            max_speed     = num("spoofing", "max_simulated_speed_mbps", 10.0) * 1e6,
+            noise_pct     = num("spoofing", "upload_noise_pct", 3.0, hi=100.0) / 100,
+            max_ratio_t   = num("spoofing", "max_ratio_per_torrent", 3.0),
+            seed_credit   = num("spoofing", "seed_credit_mb", 5.0) * 1e6,
+            stall_thr     = num("advanced", "stall_announce_threshold", 8, lo=1, get=cfg.getint),
+            min_ann_stag  = num("advanced", "min_announces_before_stagnation", 10, lo=0, get=cfg.getint),
+            corrupt_p     = num("advanced", "corrupt_field_probability", 0.05, hi=1.0),
+            target_ratio  = (num("spoofing", "target_ratio", 1.5)
+                             + cfg.getfloat("spoofing", "target_ratio_buffer", fallback=0.03)),
+            auto_stop     = cfg.getboolean("spoofing", "auto_stop_at_target", fallback=True),
+            active_hours  = active_hours,
+            always_active = (active_hours[1] - active_hours[0]) % 24 == 23,
+        )
+
+
 class TorrentStats:
-    def __init__(self, cfg):
-        self._stagnation_p   = cfg.getfloat("spoofing", "stagnation_probability", fallback=0.03)
-        self._catch_up       = cfg.getfloat("spoofing", "catch_up_factor", fallback=0.22)
-        self._max_speed      = cfg.getfloat("spoofing", "max_simulated_speed_mbps", fallback=10.0) * 1e6
-        self._noise_pct      = cfg.getfloat("spoofing", "upload_noise_pct", fallback=3.0) / 100
-        self._max_ratio_t    = cfg.getfloat("spoofing", "max_ratio_per_torrent", fallback=3.0)
-        self._seed_credit    = cfg.getfloat("spoofing", "seed_credit_mb", fallback=5.0) * 1e6
-        self._seed_target_mb = cfg.getfloat("spoofing", "seed_target_mb", fallback=500.0) * 1e6
-        self._stall_thr      = cfg.getint("advanced", "stall_announce_threshold", fallback=8)
-        self._min_ann_stag   = cfg.getint("advanced", "min_announces_before_stagnation", fallback=10)
-        self._target_buf     = cfg.getfloat("spoofing", "target_ratio_buffer", fallback=0.03)
-        self._corrupt_p      = cfg.getfloat("advanced", "corrupt_field_probability", fallback=0.05)
-        base_target          = cfg.getfloat("spoofing", "target_ratio", fallback=1.5)
-        self._target_ratio   = base_target + self._target_buf
-        self._auto_stop      = cfg.getboolean("spoofing", "auto_stop_at_target", fallback=True)
-        self._active_hours   = _parse_hours(cfg.get("advanced", "inject_hours", fallback="0-23"))
+    __slots__ = (
+        "_conf", "_cumul_rep_ul", "_cumul_rep_dl", "_cumul_real_ul", "_ann_count",
+        "_zero_dl_count", "_is_net_stalled", "_is_algo_stalled", "_prev_rep_ul",
+        "_target_reached", "_leecher_count", "_seed_fake_dl", "_history", "_mode",
+        "_last_announce_ts",
+    )
+
+    def __init__(self, conf):
+        self._conf           = conf
         self._cumul_rep_ul   = 0.0
         self._cumul_rep_dl   = 0.0
         self._cumul_real_ul  = 0.0
@@ -175,18 +272,20 @@ class TorrentStats:
         self._last_announce_ts = 0.0
 
     def _in_active_hours(self) -> bool:
+        if self._conf.always_active:
+            return True
         hour = datetime.now().hour
-        lo, hi = self._active_hours
+        lo, hi = self._conf.active_hours
         if lo <= hi:
             return lo <= hour <= hi
         return hour >= lo or hour <= hi
 
     def _smart_stagnation(self, ann, rp) -> bool:
-        if ann < self._min_ann_stag or rp < 0.30:
+        if ann < self._conf.min_ann_stag or rp < 0.30:
             return False
         if ann > 30 and rp < 0.65:
             return False
-        p = self._stagnation_p * (1.5 if rp > 0.85 else 1.1 if rp > 0.60 else 1.0)
+        p = self._conf.stagnation_p * (1.5 if rp > 0.85 else 1.1 if rp > 0.60 else 1.0)
         if self._leecher_count == 0:
             return True
         return random.random() < p
@@ -194,17 +293,17 @@ class TorrentStats:
     def _calc_upload(self, real_ul, cum_dl, interval, ann):
         if not self._in_active_hours():
             return self._cumul_rep_ul, True
-        if self._auto_stop and self._target_reached:
+        if self._conf.auto_stop and self._target_reached:
             return self._cumul_rep_ul + (real_ul * random.uniform(0.9, 1.1) if real_ul > 0 else 0), False
         if cum_dl <= 0:
-            inc = real_ul * random.uniform(1.2, 1.6) if real_ul > 0 else self._seed_credit * random.uniform(0.8, 1.2)
-            return self._cumul_rep_ul + min(inc, self._max_speed * interval), False
-        target_ul = cum_dl * self._target_ratio
+            inc = real_ul * random.uniform(1.2, 1.6) if real_ul > 0 else self._conf.seed_credit * random.uniform(0.8, 1.2)
+            return self._cumul_rep_ul + min(inc, self._conf.max_speed * interval), False
+        target_ul = cum_dl * self._conf.target_ratio
         rp        = self._cumul_rep_ul / target_ul if target_ul > 0 else 1.0
-        if self._auto_stop and rp >= 1.0:
+        if self._conf.auto_stop and rp >= 1.0:
             if not self._target_reached:
                 self._target_reached = True
-                logger.info("[TARGET_REACHED] ratio target %.2f reached, injection stopped", self._target_ratio)
+                logger.info("[TARGET_REACHED] ratio target %.2f reached, injection stopped", self._conf.target_ratio)
             return self._cumul_rep_ul + (real_ul * random.uniform(0.9, 1.1) if real_ul > 0 else 0), False
         if self._smart_stagnation(ann, rp):
             return self._cumul_rep_ul, True
@@ -212,20 +311,20 @@ class TorrentStats:
         if remaining <= 0:
             return self._cumul_rep_ul + (real_ul * random.uniform(0.9, 1.1) if real_ul > 0 else 0), False
         decay = math.exp(-0.08 * max(ann - 1, 0))
-        inc   = min(remaining * self._catch_up * (1 + 0.5 * decay), self._max_speed * interval)
-        inc   = max(0, _pareto_noise(inc, self._noise_pct))
-        return max(self._cumul_rep_ul, min(self._cumul_rep_ul + inc, cum_dl * self._max_ratio_t)), False
+        inc   = min(remaining * self._conf.catch_up * (1 + 0.5 * decay), self._conf.max_speed * interval)
+        inc   = max(0, _pareto_noise(inc, self._conf.noise_pct))
+        return max(self._cumul_rep_ul, min(self._cumul_rep_ul + inc, cum_dl * self._conf.max_ratio_t)), False
 
-    def _snapshot(self):
+    def _snapshot(self, now):
         self._history.append({
-            "t":  int(time.time()),
+            "t":  int(now),
             "ul": int(self._cumul_rep_ul),
             "dl": int(self._cumul_rep_dl),
         })
         if len(self._history) > 100:
             self._history = self._history[-100:]
 
-    def compute(self, real_ul, real_dl, interval, event=None):
+    def compute(self, real_ul, real_dl, interval, now, event=None):
         self._ann_count     += 1
         self._cumul_real_ul += real_ul
         if real_dl > 0 and self._cumul_rep_dl > real_dl * 1.5:
@@ -235,7 +334,7 @@ class TorrentStats:
         is_pure_seeder = (real_dl == 0 and self._cumul_rep_dl == 0)
         if real_dl == 0 and event not in ("started", "stopped") and not is_pure_seeder:
             self._zero_dl_count += 1
-            if self._zero_dl_count >= self._stall_thr:
+            if self._zero_dl_count >= self._conf.stall_thr:
                 self._is_net_stalled = True
         else:
             self._zero_dl_count  = 0
@@ -246,9 +345,9 @@ class TorrentStats:
             new_ul = self._prev_rep_ul
         delta              = new_ul - self._cumul_rep_ul
         self._cumul_rep_ul = self._prev_rep_ul = new_ul
-        corrupt = random.randint(0, 65535) if self._corrupt_p > 0 and random.random() < self._corrupt_p else None
+        corrupt = random.randint(0, 65535) if self._conf.corrupt_p > 0 and random.random() < self._conf.corrupt_p else None
         if self._ann_count % 5 == 0:
-            self._snapshot()
+            self._snapshot(now)
         return new_ul, self._cumul_rep_dl, delta, is_stag, corrupt
 
 
@@ -256,6 +355,10 @@ class NewGreedyAddon:
     def __init__(self):
         self._cfg            = _load_cfg()
         c                    = self._cfg
+        self._prev_log_level = logger.level
+        logger.setLevel(_parse_log_level(c.get("advanced", "log_level", fallback="INFO")))
+        _log_file.backupCount = _clamp("log_retention_days",
+                                       c.getint("advanced", "log_retention_days", fallback=LOG_RETENTION_DAYS), 1, 365)
         self._stats          = {}
         self._tracker_cumul  = {}
         self._tracker_errors = {}
@@ -264,23 +367,28 @@ class NewGreedyAddon:
         self._peer_ids       = {}
         self._uas            = {}
         self._swarm_leechers = {}
-        self._save_lock      = threading.Lock()
+        self._save_pool      = ThreadPoolExecutor(max_workers=1, thread_name_prefix="newgreedy-save")
         self._last_flush_ts  = 0.0
+        self._last_sweep_ts  = 0.0
         self._flush_interval = 60.0
         self._registry       = self._load_registry()
-        self._max_global_r   = c.getfloat("spoofing", "max_global_ratio_per_tracker", fallback=2.5)
-        self._min_interval   = c.getint("advanced", "min_announce_interval", fallback=1800)
-        self._jitter_pct     = c.getfloat("advanced", "interval_jitter_pct", fallback=0.08)
-        self._event_anom_p   = c.getfloat("advanced", "event_anomaly_probability", fallback=0.03)
-        self._corrupt_p      = c.getfloat("advanced", "corrupt_field_probability", fallback=0.05)
+        self._engine         = EngineConfig.from_cfg(c)
+        self._max_global_r   = _clamp("max_global_ratio_per_tracker",
+                                      c.getfloat("spoofing", "max_global_ratio_per_tracker", fallback=2.5), 0.0, float("inf"))
+        self._min_interval   = _clamp("min_announce_interval",
+                                      c.getint("advanced", "min_announce_interval", fallback=1800), 1, float("inf"))
+        self._jitter_pct     = _clamp("interval_jitter_pct",
+                                      c.getfloat("advanced", "interval_jitter_pct", fallback=0.08), 0.0, 1.0)
+        self._event_anom_p   = _clamp("event_anomaly_probability",
+                                      c.getfloat("advanced", "event_anomaly_probability", fallback=0.03), 0.0, 1.0)
         self._spoof_ua       = c.getboolean("anti_detection", "spoof_user_agent", fallback=True)
         self._spoof_pid      = c.getboolean("anti_detection", "spoof_peer_id", fallback=True)
         self._spoof_peers    = c.getboolean("anti_detection", "spoof_peers", fallback=True)
         self._spoof_port     = c.getboolean("anti_detection", "spoof_port", fallback=True)
         self._spoof_hdr      = c.getboolean("anti_detection", "spoof_headers", fallback=True)
+        self._ua_value       = c.get("anti_detection", "user_agent_value", fallback="qBittorrent/4.6.8")
         self._intercept_scrape = c.getboolean("anti_detection", "intercept_scrape", fallback=True)
-        lo, hi               = c.get("anti_detection", "port_range", fallback="6881-6999").split("-")
-        self._port_lo, self._port_hi = int(lo), int(hi)
+        self._port_lo, self._port_hi = _parse_port_range(c.get("anti_detection", "port_range", fallback="6881-6999"))
         self._wl             = [x.strip() for x in c.get("anti_detection", "tracker_whitelist", fallback="").split(",") if x.strip()]
         self._bl             = [x.strip() for x in c.get("anti_detection", "tracker_blacklist", fallback="").split(",") if x.strip()]
         self._persist        = c.getboolean("stats", "persist_stats", fallback=True)
@@ -291,7 +399,6 @@ class NewGreedyAddon:
                     VERSION, c.get("proxy", "listen_port", fallback="3456"))
 
     def _load_stats(self):
-        VALID = re.compile(r"^[0-9a-f]{6,40}$")
         try:
             with open(STATS_FILE) as f:
                 raw = json.load(f)
@@ -309,13 +416,13 @@ class NewGreedyAddon:
                 if k.startswith("_"):
                     continue
                 k = k.lower().strip()
-                if not VALID.match(k) or not isinstance(d, dict):
+                if not VALID_HASH_RE.match(k) or not isinstance(d, dict):
                     continue
                 ul_key = "cumul_rep_ul" if "cumul_rep_ul" in d else "rep_ul"
                 dl_key = "cumul_rep_dl" if "cumul_rep_dl" in d else "rep_dl"
                 if ul_key not in d:
                     continue
-                s = TorrentStats(self._cfg)
+                s = TorrentStats(self._engine)
                 s._cumul_rep_ul  = float(d.get(ul_key, 0))
                 s._cumul_rep_dl  = float(d.get(dl_key, 0))
                 s._cumul_real_ul = float(d.get("cumul_real_ul", 0))
@@ -335,65 +442,73 @@ class NewGreedyAddon:
         except Exception as e:
             logger.warning("Stats load error: %s", e)
 
-    def _save_stats(self, force=False):
-        now = time.time()
+    def _save_stats(self, force=False, wait=False, now=None):
+        if now is None:
+            now = time.time()
         if not force and (now - self._last_flush_ts) < self._flush_interval:
             return
-        with self._save_lock:
-            try:
-                cutoff = now - 43200
-                data = {"_schema_version": SCHEMA_VER}
-                data["_tracker_cumul"] = {
-                    domain: {"ul": tc["ul"], "dl": tc["dl"]}
-                    for domain, tc in dict(self._tracker_cumul).items()
+        try:
+            data = {"_schema_version": SCHEMA_VER}
+            data["_tracker_cumul"] = {
+                domain: {"ul": tc["ul"], "dl": tc["dl"]}
+                for domain, tc in dict(self._tracker_cumul).items()
+            }
+            for ih, s in dict(self._stats).items():
+                data[ih] = {
+                    "cumul_rep_ul":    s._cumul_rep_ul,
+                    "cumul_rep_dl":    s._cumul_rep_dl,
+                    "cumul_real_ul":   s._cumul_real_ul,
+                    "ann_count":       s._ann_count,
+                    "stalled":         s._is_net_stalled,
+                    "prev_rep_ul":     s._prev_rep_ul,
+                    "target_reached":  s._target_reached,
+                    "seed_fake_dl":    s._seed_fake_dl,
+                    "history":         s._history[-100:],
+                    "mode":            s._mode,
+                    "last_announce_ts":s._last_announce_ts,
                 }
-                pending = []
-                try:
-                    with open(PURGE_PENDING_FILE) as f:
-                        pending = json.load(f)
-                    for ih in pending:
-                        if ih in self._stats:
-                            del self._stats[ih]
-                            logger.info("[PURGE_SYNC] %s — removed from memory (web purge)", ih)
-                    import os as _os
-                    _os.remove(PURGE_PENDING_FILE)
-                except FileNotFoundError:
-                    pass
-                except Exception as e:
-                    logger.warning("purge_pending read error: %s", e)
-                purged = []
-                for ih, s in dict(self._stats).items():
-                    if s._last_announce_ts > 0 and s._last_announce_ts < cutoff and s._ann_count >= 5:
-                        purged.append(ih)
-                        continue
-                    data[ih] = {
-                        "cumul_rep_ul":    s._cumul_rep_ul,
-                        "cumul_rep_dl":    s._cumul_rep_dl,
-                        "cumul_real_ul":   s._cumul_real_ul,
-                        "ann_count":       s._ann_count,
-                        "stalled":         s._is_net_stalled,
-                        "prev_rep_ul":     s._prev_rep_ul,
-                        "target_reached":  s._target_reached,
-                        "seed_fake_dl":    s._seed_fake_dl,
-                        "history":         s._history[-100:],
-                        "mode":            s._mode,
-                        "last_announce_ts":s._last_announce_ts,
-                    }
-                for ih in purged:
-                    del self._stats[ih]
-                    logger.info("[AUTO-PURGE] %s — no announce for 12h+", ih)
-                with open(STATS_FILE, "w") as f:
-                    json.dump(data, f, indent=2)
-                self._last_flush_ts = now
-            except Exception as e:
-                logger.warning("Stats save failed: %s", e)
-
-    def _is_announce(self, url):
-        p = urlparse(url)
-        return "announce" in p.path and "scrape" not in p.path
-
-    def _tracker_allowed(self, url):
-        domain = _tracker_domain(url)
+        except Exception as e:
+            logger.warning("Stats save failed: %s", e)
+            return
+        self._last_flush_ts = now
+        future = self._save_pool.submit(self._write_stats, data)
+        if wait:
+            future.result()
+
+    def _purge_idle(self, now, force=False):
+        if not force and (now - self._last_sweep_ts) < self._flush_interval:
+            return
+        self._last_sweep_ts = now
+        try:
+            with open(PURGE_PENDING_FILE) as f:
+                pending = json.load(f)
+            for ih in pending:
+                if ih in self._stats:
+                    self._forget(ih)
+                    logger.info("[PURGE_SYNC] %s — removed from memory (web purge)", ih)
+            import os as _os
+            _os.remove(PURGE_PENDING_FILE)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("purge_pending read error: %s", e)
+        cutoff = now - 43200
+        for ih, s in dict(self._stats).items():
+            if s._last_announce_ts > 0 and s._last_announce_ts < cutoff and s._ann_count >= 5:
+                self._forget(ih)
+                logger.info("[AUTO-PURGE] %s — no announce for 12h+", ih)
+
+    def _write_stats(self, data):
+        try:
+            with open(STATS_FILE, "w") as f:
+                json.dump(data, f, indent=2)
+        except Exception as e:
+            logger.warning("Stats save failed: %s", e)
+
+    def _is_announce(self, path: bytes):
+        return b"announce" in path and b"scrape" not in path
+
+    def _tracker_allowed(self, domain):
         if self._bl and any(b in domain for b in self._bl):
             return False
         if self._wl:
@@ -408,12 +523,12 @@ class NewGreedyAddon:
         if count < TRACKER_BACKOFF_THRESHOLD:
             return False
         backoff = min(300 * (2 ** (count - TRACKER_BACKOFF_THRESHOLD)), TRACKER_BACKOFF_MAX_S)
-        return (time.time() - last_ts) < backoff
+        return (time.monotonic() - last_ts) < backoff
 
     def _record_tracker_error(self, domain):
         err = self._tracker_errors.get(domain, (0, 0))
         count = err[0] + 1
-        self._tracker_errors[domain] = (count, time.time())
+        self._tracker_errors[domain] = (count, time.monotonic())
         if count == TRACKER_BACKOFF_THRESHOLD:
             logger.warning("[TRACKER_DOWN] %s — %d consecutive errors, entering backoff", domain, count)
 
@@ -433,7 +548,7 @@ class NewGreedyAddon:
 
     def _get_stats(self, ih, ih_full=""):
         if ih not in self._stats:
-            st = TorrentStats(self._cfg)
+            st = TorrentStats(self._engine)
             if ih in self._registry:
                 try:
                     st._seed_fake_dl = float(self._registry[ih].get("size_bytes", 0))
@@ -442,139 +557,138 @@ class NewGreedyAddon:
             self._stats[ih] = st
         return self._stats[ih]
 
-    def _parse_int(self, qs, key, default=0):
+    def _forget(self, ih):
+        self._stats.pop(ih, None)
+        self._last_seen.pop(ih, None)
+        self._ports.pop(ih, None)
+        self._peer_ids.pop(ih, None)
+        self._uas.pop(ih, None)
+        self._swarm_leechers.pop(ih, None)
+
+    def _parse_int(self, fields, key, default=0):
         try:
-            return int(qs.get(key, [default])[0])
+            return int(fields.get(key, default))
         except Exception:
             return default
 
     def request(self, flow: http.HTTPFlow):
-        url = flow.request.pretty_url
-        if not self._tracker_allowed(url):
+        domain = flow.request.pretty_host
+        if not self._tracker_allowed(domain):
             return
-        if self._intercept_scrape and "scrape" in urlparse(url).path:
+        path_only, raw_query = _split_path(flow.request.data.path)
+        if self._intercept_scrape and b"scrape" in path_only:
             return
-        if not self._is_announce(url):
+        if not self._is_announce(path_only):
             return
-        domain    = _tracker_domain(url)
         if self._tracker_in_backoff(domain):
             return
-        raw_path  = flow.request.data.path
-        q_start   = raw_path.find(b"?")
-        raw_query = raw_path[q_start + 1:] if q_start != -1 else b""
-        ih_hex    = _extract_infohash(raw_query)
+        fields    = _query_fields(raw_query)
+        ih_hex    = _extract_infohash(fields)
         if not ih_hex or len(ih_hex) < 6:
             return
         ih_key    = ih_hex[:8]
-        parsed    = urlparse(url)
-        qs        = parse_qs(parsed.query, keep_blank_values=True)
+        flow.metadata["newgreedy_ih"] = ih_key
         now       = time.time()
-        last      = self._last_seen.get(ih_key + domain, 0)
+        seen      = self._last_seen.setdefault(ih_key, {})
+        last      = seen.get(domain, 0)
         interval  = max(now - last, self._min_interval) if last > 0 else self._min_interval
         interval  += interval * self._jitter_pct * random.uniform(-1, 1)
-        self._last_seen[ih_key + domain] = now
-        event     = qs.get("event", [""])[0]
+        seen[domain] = now
+        event     = fields.get(b"event", b"").decode("latin-1")
 
         if event == "stopped" and self._auto_purge:
-            if ih_key in self._stats:
-                del self._stats[ih_key]
-                for k in list(self._last_seen.keys()):
-                    if k.startswith(ih_key):
-                        del self._last_seen[k]
-                self._ports.pop(ih_key, None)
-                self._peer_ids.pop(ih_key, None)
-                self._uas.pop(ih_key, None)
+            had_stats = ih_key in self._stats
+            self._forget(ih_key)
+            if had_stats:
                 if self._persist:
-                    self._save_stats(force=True)
+                    self._save_stats(force=True, now=now)
                 logger.info("[PURGED] %s — removed after event=stopped", ih_key)
             return
 
-        real_ul  = self._parse_int(qs, "uploaded")
-        real_dl  = self._parse_int(qs, "downloaded")
-        left     = self._parse_int(qs, "left")
+        real_ul  = self._parse_int(fields, b"uploaded")
+        real_dl  = self._parse_int(fields, b"downloaded")
+        left     = self._parse_int(fields, b"left")
         st       = self._get_stats(ih_key, ih_hex)
         st._mode = "seed" if left == 0 else "down"
         st._last_announce_ts = now
 
-        swarm_key = domain + ih_key
-        if swarm_key in self._swarm_leechers:
-            st._leecher_count = self._swarm_leechers[swarm_key]
+        leechers = self._swarm_leechers.get(ih_key, {}).get(domain)
+        if leechers is not None:
+            st._leecher_count = leechers
 
-        new_ul, new_dl, delta_ul, is_stag, corrupt_val = st.compute(real_ul, real_dl, interval, event)
+        new_ul, new_dl, delta_ul, is_stag, corrupt_val = st.compute(real_ul, real_dl, interval, now, event)
 
         tc = self._tracker_cumul.setdefault(domain, {"ul": 0.0, "dl": 0.0})
         tc["dl"] += real_dl
-        if tc["dl"] > 0 and (tc["ul"] + delta_ul) / tc["dl"] > self._max_global_r:
+        if delta_ul > 0 and tc["dl"] > 0 and (tc["ul"] + delta_ul) / tc["dl"] > self._max_global_r:
             allowed_delta = max(0.0, self._max_global_r * tc["dl"] - tc["ul"])
             new_ul = st._prev_rep_ul + allowed_delta
             new_ul = max(st._prev_rep_ul, new_ul)
             delta_ul = new_ul - st._cumul_rep_ul
             st._cumul_rep_ul = st._prev_rep_ul = new_ul
             logger.info("[GLOBAL_CAP] %s | tracker_ratio capped → UL adjusted to %.1fM",
-                        domain, new_ul / 1e6)
+                        domain, new_ul * _BYTES_TO_MB)
         tc["ul"] += delta_ul
 
         is_pure_seeder = (left == 0 and real_dl == 0)
-        patches = {"uploaded": int(new_ul)}
+        patches = {b"uploaded": int(new_ul)}
 
         if is_pure_seeder:
             if st._seed_fake_dl == 0:
                 ihb = bytes.fromhex(ih_hex[:16]) if len(ih_hex) >= 16 else b"\x00" * 8
                 base = int.from_bytes(ihb[:4], "big")
                 st._seed_fake_dl = (base % 49000 + 1000) * 1e6
-            patches["downloaded"] = int(st._seed_fake_dl)
+            patches[b"downloaded"] = int(st._seed_fake_dl)
         else:
-            patches["downloaded"] = int(new_dl + struct.pack(">I", random.randint(1, 4096))[0])
+            patches[b"downloaded"] = int(new_dl)
 
         if self._spoof_port:
             if ih_key not in self._ports:
                 self._ports[ih_key] = random.randint(self._port_lo, self._port_hi)
-            patches["port"] = self._ports[ih_key]
+            patches[b"port"] = self._ports[ih_key]
 
         if self._spoof_peers:
-            nw = self._parse_int(qs, "numwant", 50)
-            patches["numwant"] = int(nw * random.uniform(0.85, 1.15))
+            nw = self._parse_int(fields, b"numwant", 50)
+            patches[b"numwant"] = int(nw * random.uniform(0.85, 1.15))
 
         if corrupt_val is not None:
-            patches["corrupt"] = corrupt_val
+            patches[b"corrupt"] = corrupt_val
 
         if random.random() < self._event_anom_p and event not in ("started", "stopped"):
-            patches["event"] = "started"
+            patches[b"event"] = b"started"
 
         if self._spoof_pid:
             if ih_key not in self._peer_ids:
                 pid = _rand_peer_id()
                 self._peer_ids[ih_key] = pid
                 self._uas[ih_key] = _ua_for_prefix(pid[:8])
-            _unreserved = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
-            pid_pct   = b"peer_id=" + b"".join(
-                bytes([b]) if b in _unreserved else (b"%" + format(b, "02X").encode())
-                for b in self._peer_ids[ih_key]
-            )
-            parts     = raw_query.split(b"&")
-            parts     = [p for p in parts if not p.startswith(b"peer_id=")]
-            parts.append(pid_pct)
-            raw_query = b"&".join(parts)
+            patches[b"peer_id"] = _pct_encode(self._peer_ids[ih_key])
 
         new_raw_query          = _patch_query_bytes(raw_query, patches)
-        path_only              = raw_path[:q_start] if q_start != -1 else raw_path
         flow.request.data.path = path_only + b"?" + new_raw_query
 
         if self._spoof_hdr:
-            ua = (self._uas.get(ih_key, "qBittorrent/4.6.8") if self._spoof_ua
-                  else self._cfg.get("anti_detection", "user_agent_value", fallback="qBittorrent/4.6.8"))
+            ua = self._uas.get(ih_key, "qBittorrent/4.6.8") if self._spoof_ua else self._ua_value
             flow.request.headers["User-Agent"]      = ua
             flow.request.headers["Accept"]          = _accept_for_ua(ua)
             flow.request.headers["Accept-Language"] = "en-US,en;q=0.9"
             flow.request.headers["Connection"]      = "keep-alive"
 
+        if logger.isEnabledFor(logging.INFO):
+            self._log_announce(st, ih_key, left, new_ul, delta_ul, is_stag)
+
+        self._purge_idle(now)
+        if self._persist:
+            self._save_stats(now=now)
+
+    def _log_announce(self, st, ih_key, left, new_ul, delta_ul, is_stag):
         mode  = "SEED" if left == 0 else "DOWN"
-        cum_dl= st._cumul_rep_dl / 1e6
-        cum_ul= new_ul / 1e6
-        delta = delta_ul / 1e6
+        cum_dl= st._cumul_rep_dl * _BYTES_TO_MB
+        cum_ul= new_ul * _BYTES_TO_MB
+        delta = delta_ul * _BYTES_TO_MB
         ratio = new_ul / st._cumul_rep_dl if st._cumul_rep_dl > 0 else 0.0
         avg_d = new_ul / st._ann_count if st._ann_count > 1 else delta_ul
-        eta   = int(max(0, st._cumul_rep_dl * st._target_ratio - new_ul) / avg_d) if avg_d > 0 else 0
+        eta   = int(max(0, st._cumul_rep_dl * st._conf.target_ratio - new_ul) / avg_d) if avg_d > 0 else 0
 
         stag_t   = " [STAG]"           if is_stag               else ""
         stall_t  = " [STALL_NET]"      if st._is_net_stalled    else ""
@@ -589,21 +703,21 @@ class NewGreedyAddon:
             logger.info("[%-4s] %-8s | UL:%7.1fM +%6.1fM #%d%s",
                         mode, ih_key, cum_ul, delta, st._ann_count, flags)
 
-        if self._persist:
-            self._save_stats()
+    def responseheaders(self, flow: http.HTTPFlow):
+        if not self._is_announce(_split_path(flow.request.data.path)[0]):
+            flow.response.stream = True
 
     def response(self, flow: http.HTTPFlow):
-        url = flow.request.pretty_url
-        if not self._is_announce(url):
-            return
-        domain    = _tracker_domain(url)
-        raw_path  = flow.request.data.path
-        q_start   = raw_path.find(b"?")
-        raw_query = raw_path[q_start + 1:] if q_start != -1 else b""
-        ih_hex    = _extract_infohash(raw_query)
-        if not ih_hex or len(ih_hex) < 6:
+        path_only, raw_query = _split_path(flow.request.data.path)
+        if not self._is_announce(path_only):
             return
-        ih_key = ih_hex[:8]
+        domain    = flow.request.pretty_host
+        ih_key    = flow.metadata.get("newgreedy_ih")
+        if ih_key is None:
+            ih_hex = _extract_infohash(_query_fields(raw_query))
+            if not ih_hex or len(ih_hex) < 6:
+                return
+            ih_key = ih_hex[:8]
         try:
             status = flow.response.status_code
             if status >= 500:
@@ -612,20 +726,37 @@ class NewGreedyAddon:
                 self._record_tracker_success(domain)
             body       = flow.response.content
             incomplete = _bencode_get_int(body, b"incomplete")
-            if incomplete >= 0:
-                swarm_key = domain + ih_key
-                self._swarm_leechers[swarm_key] = incomplete
-                st = self._get_stats(ih_key)
+            st         = self._stats.get(ih_key)
+            if incomplete >= 0 and st is not None:
+                self._swarm_leechers.setdefault(ih_key, {})[domain] = incomplete
                 st._leecher_count = incomplete
                 if incomplete == 0:
                     logger.debug("[SWARM] %s@%s — 0 leechers, stagnation forced", ih_key, domain)
         except Exception:
             pass
 
+    def error(self, flow: http.HTTPFlow):
+        # Also fired when the torrent client hangs up or the flow is killed —
+        # only failures on the tracker side count toward backoff.
+        if flow.response is not None or not flow.client_conn.connected:
+            return
+        if flow.error.msg == flow.error.KILLED_MESSAGE:
+            return
+        if self._is_announce(_split_path(flow.request.data.path)[0]):
+            self._record_tracker_error(flow.request.pretty_host)
+
     def done(self):
         if self._persist:
-            self._save_stats(force=True)
+            self._purge_idle(time.time(), force=True)
+            self._save_stats(force=True, wait=True)
+        self._save_pool.shutdown(wait=True)
         logger.info("NewGreedy %s stopping — stats saved.", VERSION)
+        logger.removeHandler(_queue_handler)
+        logger.propagate = True
+        logger.setLevel(self._prev_log_level)
+        _log_listener.stop()
+        for h in _log_handlers:
+            h.close()
 
 
 addons = [NewGreedyAddon()]
@@ -27,6 +27,10 @@ _raw_cache      = None
 _raw_cache_ts   = 0.0
 _raw_cache_ttl  = 2.0
 
+_release_cache     = None
+_release_cache_ts  = 0.0
+_release_cache_ttl = 86400.0
+
 
 def set_config(c):
     global _cfg
@@ -177,6 +181,8 @@ async def api_history():
 @app.get("/api/history/{ih}")
 async def api_history_single(ih: str):
     ih = ih[:8].lower()
+    if not VALID_HASH_RE.match(ih):
+        return JSONResponse({"error": "invalid hash"}, status_code=400)
     data = _load_stats()
     if ih not in data:
         return JSONResponse({"error": "not found"}, status_code=404)
@@ -202,13 +208,24 @@ async def api_config_reload():
     return {"status": "reloaded"}
 
 
+def _fetch_latest_release():
+    global _release_cache, _release_cache_ts
+    now = time.monotonic()
+    if _release_cache is not None and (now - _release_cache_ts) < _release_cache_ttl:
+        return _release_cache
+    url = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
+    req = urllib.request.Request(url, headers={"User-Agent": "NewGreedy-updater"})
+    with urllib.request.urlopen(req, timeout=4) as r:
+        data = json.loads(r.read())
+    _release_cache    = data
+    _release_cache_ts = now
+    return data
+
+
 @app.get("/api/version")
 async def api_version():
     try:
-        url = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
-        req = urllib.request.Request(url, headers={"User-Agent": "NewGreedy-updater"})
-        with urllib.request.urlopen(req, timeout=4) as r:
-            data = json.loads(r.read())
+        data   = await asyncio.to_thread(_fetch_latest_release)
         latest = data.get("tag_name", "unknown")
 
         def _pv(v):
@@ -366,6 +383,8 @@ async def ws_logs(ws: WebSocket):
         while True:
             try:
                 with open(LOG_FILE, "rb") as f:
+                    if f.seek(0, 2) < last_pos:
+                        last_pos = 0
                     f.seek(last_pos)
                     chunk    = f.read()
                     last_pos = f.tell()